@@ -1,6 +1,7 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from cam_utils import capture_snapshot
 from timelapse_utils import stitch_timelapse, stitch_weekly_timelapse, cleanup_old_data
+from snapshot_pack import pack_snapshots
 from settings import SNAPSHOT_INTERVAL_MIN, TIMELAPSE_STITCH_HOUR
 from logging_setup import setup_logger
 
@@ -15,6 +16,8 @@ def start_scheduler():
     logger.info(f"Timelapse stitch job scheduled daily at {TIMELAPSE_STITCH_HOUR}:00")
     scheduler.add_job(stitch_weekly_timelapse, "cron", day_of_week="sun", hour=TIMELAPSE_STITCH_HOUR, minute=30, id="weekly_timelapse_job", replace_existing=True)
     logger.info("Weekly timelapse stitch job scheduled Sundays at %d:30", TIMELAPSE_STITCH_HOUR)
+    scheduler.add_job(pack_snapshots, "cron", hour=0, minute=15, id="pack_job", replace_existing=True)
+    logger.info("Snapshot pack job scheduled daily at 0:15")
     scheduler.add_job(cleanup_old_data, "cron", day_of_week="sun", hour=TIMELAPSE_STITCH_HOUR, minute=45, id="cleanup_job", replace_existing=True)
     logger.info("Cleanup job scheduled Sundays at %d:45", TIMELAPSE_STITCH_HOUR)
     scheduler.start()
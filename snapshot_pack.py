@@ -0,0 +1,280 @@
+import os
+import glob
+import mmap
+import bisect
+import struct
+from datetime import datetime
+from logging_setup import setup_logger
+from settings import SNAPSHOT_DIR, CAMERAS
+
+logger = setup_logger("snapshot_pack")
+
+# Pack layout: MAGIC | jpeg frames back to back | index entries | footer
+# Index entry: HHMMSS timestamp, byte offset, byte length. Footer: index offset, entry count, INDEX_MAGIC.
+PACK_EXT = ".pack"
+MAGIC = b"PLNTPAK1"
+INDEX_MAGIC = b"PLNTIDX1"
+_ENTRY = struct.Struct("<6sQI")
+_FOOTER = struct.Struct("<QI8s")
+
+
+def pack_path(snapshot_dir, date_str):
+    return os.path.join(snapshot_dir, date_str + PACK_EXT)
+
+
+def _is_timestamp(name):
+    return len(name) == 6 and name.isdigit()
+
+
+class SnapshotPack:
+    """Read-only mmap view over a packed snapshot day. Frames are sorted by timestamp."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < len(MAGIC) + _FOOTER.size or self._mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a snapshot pack: {path}")
+            index_offset, count, index_magic = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+            if index_magic != INDEX_MAGIC or index_offset + count * _ENTRY.size != len(self._mm) - _FOOTER.size:
+                raise ValueError(f"Corrupt snapshot pack index: {path}")
+            entries = [_ENTRY.unpack_from(self._mm, index_offset + i * _ENTRY.size) for i in range(count)]
+            previous = b""
+            for timestamp, offset, length in entries:
+                if offset < len(MAGIC) or offset + length > index_offset or timestamp <= previous:
+                    raise ValueError(f"Corrupt snapshot pack entry {timestamp!r}: {path}")
+                previous = timestamp
+        except Exception:
+            self._mm.close()
+            raise
+        self._timestamps = [ts.decode("ascii") for ts, _, _ in entries]
+        self._spans = [(offset, length) for _, offset, length in entries]
+        self._view = memoryview(self._mm)
+        self._live = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # A suspended iter_frames() generator still holds a slice of the mapping; drop it so the unmap can go ahead
+        if self._live is not None:
+            self._live.release()
+            self._live = None
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            logger.warning(f"Snapshot pack {self.path} still has frames exported, deferring unmap to garbage collection")
+
+    def timestamps(self):
+        return list(self._timestamps)
+
+    def iter_frames(self):
+        """Yield each frame as a zero-copy memoryview; a view is only valid until the next one is requested."""
+        for offset, length in self._spans:
+            if self._closed:
+                raise ValueError(f"Snapshot pack is closed: {self.path}")
+            self._live = self._view[offset:offset + length]
+            try:
+                yield self._live
+            finally:
+                if self._live is not None:
+                    self._live.release()
+                    self._live = None
+
+    def get(self, timestamp):
+        """Return the JPEG bytes captured at timestamp (HHMMSS), or None."""
+        i = bisect.bisect_left(self._timestamps, timestamp)
+        if i == len(self._timestamps) or self._timestamps[i] != timestamp:
+            return None
+        if self._closed:
+            raise ValueError(f"Snapshot pack is closed: {self.path}")
+        offset, length = self._spans[i]
+        return self._mm[offset:offset + length]
+
+
+class SnapshotDir:
+    """Same interface as SnapshotPack for a day that is still stored as loose JPEG files."""
+    def __init__(self, path):
+        self.path = path
+        # Only HHMMSS captures count as frames, matching what pack_day packs
+        self._frames = sorted(f for f in glob.glob(os.path.join(path, "*.jpg")) if _is_timestamp(os.path.splitext(os.path.basename(f))[0]))
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def timestamps(self):
+        return [os.path.splitext(os.path.basename(f))[0] for f in self._frames]
+
+    def iter_frames(self):
+        for frame in self._frames:
+            with open(frame, "rb") as f:
+                yield f.read()
+
+    def get(self, timestamp):
+        frame = os.path.join(self.path, timestamp + ".jpg")
+        if not os.path.isfile(frame):
+            return None
+        with open(frame, "rb") as f:
+            return f.read()
+
+
+class SnapshotMerged:
+    """A packed day plus loose frames that landed in its directory afterwards. Loose frames win on equal timestamps."""
+    def __init__(self, pack, loose):
+        self.path = pack.path
+        self._pack = pack
+        self._loose = loose
+        loose_timestamps = set(loose.timestamps())
+        self._order = sorted([(ts, loose) for ts in loose_timestamps] + [(ts, pack) for ts in pack.timestamps() if ts not in loose_timestamps], key=lambda e: e[0])
+
+    def __len__(self):
+        return len(self._order)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._pack.close()
+        self._loose.close()
+
+    def timestamps(self):
+        return [ts for ts, _ in self._order]
+
+    def iter_frames(self):
+        for timestamp, source in self._order:
+            frame = source.get(timestamp)
+            if frame is None:
+                raise FileNotFoundError(f"Snapshot {timestamp} vanished from {source.path}")
+            yield frame
+
+    def get(self, timestamp):
+        frame = self._loose.get(timestamp)
+        return frame if frame is not None else self._pack.get(timestamp)
+
+
+def open_day(snapshot_dir, date_str, label=""):
+    """Open a snapshot day from its pack and/or its directory. Returns None if neither exists."""
+    path = pack_path(snapshot_dir, date_str)
+    day_dir = os.path.join(snapshot_dir, date_str)
+    loose = SnapshotDir(day_dir) if os.path.isdir(day_dir) else None
+    if os.path.isfile(path):
+        pack = SnapshotPack(path)
+        if loose is not None and len(loose):
+            logger.warning(f"{date_str} has both a pack and {len(loose)} loose frames, reading both{' [' + label + ']' if label else ''}")
+            return SnapshotMerged(pack, loose)
+        return pack
+    return loose
+
+
+def pack_day(snapshot_dir, date_str, label=""):
+    """Compact a closed day's JPEG directory into a single pack file, then remove the directory."""
+    if date_str >= datetime.now().strftime("%Y-%m-%d"):
+        logger.warning(f"Refusing to pack open day {date_str}{' [' + label + ']' if label else ''}")
+        return None
+    day_dir = os.path.join(snapshot_dir, date_str)
+    if not os.path.isdir(day_dir):
+        return None
+    output_path = pack_path(snapshot_dir, date_str)
+    tmp_path = output_path + ".tmp"
+    frames = []
+    for frame in sorted(glob.glob(os.path.join(day_dir, "*.jpg"))):
+        timestamp = os.path.splitext(os.path.basename(frame))[0]
+        if not _is_timestamp(timestamp):
+            logger.warning(f"Not packing unexpected snapshot name {frame}, leaving it in place{' [' + label + ']' if label else ''}")
+            continue
+        frames.append((timestamp, frame))
+    if not frames:
+        return None
+    if os.path.isfile(output_path):
+        # A pack already exists (e.g. frames landed in the directory after packing); fold it back in
+        with SnapshotPack(output_path) as existing:
+            loose = {ts for ts, _ in frames}
+            carried = [(ts, existing.get(ts)) for ts in existing.timestamps() if ts not in loose]
+    else:
+        carried = []
+    entries = []
+    try:
+        with open(tmp_path, "wb") as out:
+            out.write(MAGIC)
+            for timestamp, source in sorted(frames + carried, key=lambda e: e[0]):
+                if isinstance(source, bytes):
+                    data = source
+                else:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                entries.append((timestamp, out.tell(), len(data)))
+                out.write(data)
+            index_offset = out.tell()
+            for timestamp, offset, length in entries:
+                out.write(_ENTRY.pack(timestamp.encode("ascii"), offset, length))
+            out.write(_FOOTER.pack(index_offset, len(entries), INDEX_MAGIC))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    for _, frame in frames:
+        os.remove(frame)
+    leftover = os.listdir(day_dir)
+    if leftover:
+        logger.warning(f"Left {len(leftover)} unpacked files in {day_dir}{' [' + label + ']' if label else ''}")
+    else:
+        os.rmdir(day_dir)
+    logger.info(f"Packed {len(entries)} snapshots into {output_path} ({os.path.getsize(output_path)} bytes){' [' + label + ']' if label else ''}")
+    return output_path
+
+
+def pack_closed_days(snapshot_dir, label=""):
+    today = datetime.now().strftime("%Y-%m-%d")
+    if not os.path.isdir(snapshot_dir):
+        return []
+    packed = []
+    for dirname in sorted(os.listdir(snapshot_dir)):
+        try:
+            datetime.strptime(dirname, "%Y-%m-%d")
+        except ValueError:
+            continue
+        if dirname >= today or not os.path.isdir(os.path.join(snapshot_dir, dirname)):
+            continue
+        try:
+            path = pack_day(snapshot_dir, dirname, label)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to pack {snapshot_dir}/{dirname}{' [' + label + ']' if label else ''}: {e}")
+            continue
+        if path:
+            packed.append(path)
+    return packed
+
+
+def pack_snapshots():
+    if not CAMERAS:
+        return pack_closed_days(SNAPSHOT_DIR)
+    for cam in CAMERAS:
+        pack_closed_days(cam["snapshot_dir"], cam["label"])
@@ -2,80 +2,128 @@ import os
 import shutil
 import subprocess
 import glob
+import tempfile
+import threading
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from logging_setup import setup_logger
 from settings import SNAPSHOT_DIR, TIMELAPSE_DIR, CAMERAS
+from snapshot_pack import open_day, PACK_EXT
 
 logger = setup_logger("timelapse")
 
 
+def _run_ffmpeg_with_frames(cmd, sources, timeout):
+    """Run ffmpeg reading JPEG frames from stdin, fed from each source in order by a writer thread.
+    Re-raises anything that goes wrong while reading frames, so a short feed is never mistaken for a finished video."""
+    feed_errors = []
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        def _feed():
+            try:
+                for source in sources:
+                    for frame in source.iter_frames():
+                        proc.stdin.write(frame)
+            except BrokenPipeError:
+                # ffmpeg exited early; its return code reports why
+                pass
+            except Exception as e:
+                feed_errors.append(e)
+                proc.kill()
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+        writer = threading.Thread(target=_feed, daemon=True)
+        writer.start()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            writer.join()
+        if feed_errors:
+            raise feed_errors[0]
+        stderr.seek(0)
+        return proc.returncode, stderr.read().decode(errors="replace")
+
+
 def _stitch_daily(snapshot_dir, timelapse_dir, date_str, label=""):
-    day_dir = os.path.join(snapshot_dir, date_str)
-    if not os.path.isdir(day_dir):
-        logger.warning(f"No snapshot directory for {date_str}{' [' + label + ']' if label else ''}")
+    try:
+        day = open_day(snapshot_dir, date_str, label)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to open snapshots for {date_str}{' [' + label + ']' if label else ''}: {e}")
         return None
-    frames = sorted(glob.glob(os.path.join(day_dir, "*.jpg")))
-    if len(frames) < 2:
-        logger.warning(f"Only {len(frames)} frames for {date_str}{' [' + label + ']' if label else ''}, skipping")
+    if day is None:
+        logger.warning(f"No snapshots for {date_str}{' [' + label + ']' if label else ''}")
         return None
-    os.makedirs(timelapse_dir, exist_ok=True)
-    output_path = os.path.join(timelapse_dir, f"{date_str}.mp4")
-    list_file = os.path.join(day_dir, "frames.txt")
-    with open(list_file, "w") as f:
-        for frame in frames:
-            f.write(f"file '{frame}'\nduration 0.15\n")
-        f.write(f"file '{frames[-1]}'\n")
-    cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c:v", "libx264", "-profile:v", "baseline", "-pix_fmt", "yuv420p", "-r", "20", "-g", "1", "-crf", "20", "-tune", "stillimage", "-movflags", "+faststart", output_path]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode != 0:
-            logger.error(f"ffmpeg daily timelapse failed{' [' + label + ']' if label else ''}: {result.stderr[-500:]}")
+    with day:
+        if len(day) < 2:
+            logger.warning(f"Only {len(day)} frames for {date_str}{' [' + label + ']' if label else ''}, skipping")
+            return None
+        os.makedirs(timelapse_dir, exist_ok=True)
+        output_path = os.path.join(timelapse_dir, f"{date_str}.mp4")
+        # 0.15s per frame
+        cmd = ["ffmpeg", "-y", "-f", "image2pipe", "-framerate", "20/3", "-c:v", "mjpeg", "-i", "-", "-c:v", "libx264", "-profile:v", "baseline", "-pix_fmt", "yuv420p", "-r", "20", "-g", "1", "-crf", "20", "-tune", "stillimage", "-movflags", "+faststart", output_path]
+        try:
+            returncode, stderr = _run_ffmpeg_with_frames(cmd, [day], 300)
+            if returncode != 0:
+                logger.error(f"ffmpeg daily timelapse failed{' [' + label + ']' if label else ''}: {stderr[-500:]}")
+                return None
+            logger.info(f"Daily timelapse created: {output_path} from {len(day)} frames{' [' + label + ']' if label else ''}")
+            return output_path
+        except subprocess.TimeoutExpired:
+            logger.error(f"ffmpeg daily timelapse timed out{' [' + label + ']' if label else ''}")
+            return None
+        except Exception as e:
+            logger.error(f"Reading frames for daily timelapse failed{' [' + label + ']' if label else ''}: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
             return None
-        logger.info(f"Daily timelapse created: {output_path} from {len(frames)} frames{' [' + label + ']' if label else ''}")
-        return output_path
-    except subprocess.TimeoutExpired:
-        logger.error(f"ffmpeg daily timelapse timed out{' [' + label + ']' if label else ''}")
-        return None
-    finally:
-        if os.path.exists(list_file):
-            os.remove(list_file)
 
 
 def _stitch_weekly(snapshot_dir, timelapse_dir, label=""):
     today = datetime.now()
     week_end = today.strftime("%Y-%m-%d")
     week_start = (today - timedelta(days=6)).strftime("%Y-%m-%d")
-    all_frames = []
-    for i in range(7):
-        day = (today - timedelta(days=6 - i)).strftime("%Y-%m-%d")
-        day_dir = os.path.join(snapshot_dir, day)
-        if os.path.isdir(day_dir):
-            all_frames.extend(sorted(glob.glob(os.path.join(day_dir, "*.jpg"))))
-    if len(all_frames) < 10:
-        logger.warning(f"Only {len(all_frames)} frames for week {week_start} to {week_end}{' [' + label + ']' if label else ''}, skipping")
-        return None
-    weekly_dir = os.path.join(timelapse_dir, "weekly")
-    os.makedirs(weekly_dir, exist_ok=True)
-    output_path = os.path.join(weekly_dir, f"week_{week_start}_to_{week_end}.mp4")
-    list_file = os.path.join(timelapse_dir, "weekly_frames.txt")
-    with open(list_file, "w") as f:
-        for frame in all_frames:
-            f.write(f"file '{frame}'\nduration 0.09\n")
-        f.write(f"file '{all_frames[-1]}'\n")
-    cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c:v", "libx264", "-profile:v", "baseline", "-pix_fmt", "yuv420p", "-r", "20", "-g", "1", "-crf", "20", "-tune", "stillimage", "-movflags", "+faststart", output_path]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-        if result.returncode != 0:
-            logger.error(f"ffmpeg weekly timelapse failed{' [' + label + ']' if label else ''}: {result.stderr[-500:]}")
+    with ExitStack() as stack:
+        days = []
+        for i in range(7):
+            date_str = (today - timedelta(days=6 - i)).strftime("%Y-%m-%d")
+            try:
+                day = open_day(snapshot_dir, date_str, label)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to open snapshots for {date_str}, leaving it out of the week{' [' + label + ']' if label else ''}: {e}")
+                continue
+            if day is not None:
+                days.append(stack.enter_context(day))
+        frame_count = sum(len(day) for day in days)
+        if frame_count < 10:
+            logger.warning(f"Only {frame_count} frames for week {week_start} to {week_end}{' [' + label + ']' if label else ''}, skipping")
+            return None
+        weekly_dir = os.path.join(timelapse_dir, "weekly")
+        os.makedirs(weekly_dir, exist_ok=True)
+        output_path = os.path.join(weekly_dir, f"week_{week_start}_to_{week_end}.mp4")
+        # 0.09s per frame
+        cmd = ["ffmpeg", "-y", "-f", "image2pipe", "-framerate", "100/9", "-c:v", "mjpeg", "-i", "-", "-c:v", "libx264", "-profile:v", "baseline", "-pix_fmt", "yuv420p", "-r", "20", "-g", "1", "-crf", "20", "-tune", "stillimage", "-movflags", "+faststart", output_path]
+        try:
+            returncode, stderr = _run_ffmpeg_with_frames(cmd, days, 600)
+            if returncode != 0:
+                logger.error(f"ffmpeg weekly timelapse failed{' [' + label + ']' if label else ''}: {stderr[-500:]}")
+                return None
+            logger.info(f"Weekly timelapse created: {output_path} from {frame_count} frames{' [' + label + ']' if label else ''}")
+            return output_path
+        except subprocess.TimeoutExpired:
+            logger.error(f"ffmpeg weekly timelapse timed out{' [' + label + ']' if label else ''}")
+            return None
+        except Exception as e:
+            logger.error(f"Reading frames for weekly timelapse failed{' [' + label + ']' if label else ''}: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
             return None
-        logger.info(f"Weekly timelapse created: {output_path} from {len(all_frames)} frames{' [' + label + ']' if label else ''}")
-        return output_path
-    except subprocess.TimeoutExpired:
-        logger.error(f"ffmpeg weekly timelapse timed out{' [' + label + ']' if label else ''}")
-        return None
-    finally:
-        if os.path.exists(list_file):
-            os.remove(list_file)
 
 
 def stitch_timelapse(date_str=None):
@@ -166,6 +214,13 @@ def cleanup_old_data(snapshot_keep_days=9, daily_keep_days=30):
             continue
         for dirname in os.listdir(snap_dir):
             try:
+                pack_name = dirname[:-len(".tmp")] if dirname.endswith(PACK_EXT + ".tmp") else dirname
+                if pack_name.endswith(PACK_EXT):
+                    # Packed days (and any temp file left by a failed pack) go with a single unlink
+                    if datetime.strptime(pack_name[:-len(PACK_EXT)], "%Y-%m-%d") < cutoff_snap:
+                        os.remove(os.path.join(snap_dir, dirname))
+                        logger.info(f"Cleaned up snapshot pack: {snap_dir}/{dirname}")
+                    continue
                 dir_date = datetime.strptime(dirname, "%Y-%m-%d")
                 if dir_date < cutoff_snap:
                     shutil.rmtree(os.path.join(snap_dir, dirname))